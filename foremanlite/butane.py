@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Tools for working with butane files."""
+import functools
+import os
 import subprocess
 import typing as t
 from pathlib import Path
@@ -47,8 +49,31 @@ def render_butane_string(
     ------
     ValueError
         If the butane content could not be rendered
+
+    Notes
+    -----
+    Butane's output only depends on its input, so results are cached
+    by content and by the executable (including its mtime, so an
+    upgraded butane is picked up), rather than starting butane again
+    for the same content.
     """
 
+    try:
+        exec_mtime: t.Optional[int] = os.stat(butane_exec).st_mtime_ns
+    except OSError:
+        # let running butane report the problem, see below
+        exec_mtime = None
+    return _render_butane_string(source, butane_exec, exec_mtime)
+
+
+@functools.lru_cache(maxsize=256)
+def _render_butane_string(
+    source: str,
+    butane_exec: str,
+    exec_mtime: t.Optional[int],  # pylint: disable=unused-argument
+) -> str:
+    """Run butane for `render_butane_string`, caching the result."""
+
     try:
         proc = subprocess.run(
             butane_exec,
@@ -99,10 +99,11 @@ def print_machines(config: Config, **kwargs):
         "groups",
         "vars",
     ]
-    for machine in machines:
-        machine_groups = sorted(
-            group_set.filter(machine), key=lambda group: group.name
-        )
+    machines_list = list(machines)
+    for machine, groups in zip(
+        machines_list, group_set.filter_many(machines_list)
+    ):
+        machine_groups = sorted(groups, key=lambda group: group.name)
         group_names = "\n".join([group.name for group in machine_groups])
         group_vars = {}
         for group in machine_groups:  # note the sorting above
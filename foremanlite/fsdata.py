@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Tools for reading and caching data from the local filesystem."""
+import functools
 import hashlib
 import logging
 import os
@@ -14,6 +15,28 @@ from foremanlite.logging import get as get_logger
 SHA256 = t.NewType("SHA256", str)
 
 
+def _read_bytes(path: Path) -> bytes:
+    """
+    Read the given path unbuffered, sizing the read from fstat.
+
+    Raises
+    ------
+    OSError
+        If the given Path cannot be read successfully.
+    """
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Ask for one byte more than fstat reports so a file that grew
+        # between the stat and the read is still read in full below.
+        chunks = [os.read(fd, os.fstat(fd).st_size + 1)]
+        while chunks[-1]:
+            chunks.append(os.read(fd, 1 << 16))
+    finally:
+        os.close(fd)
+    return b"".join(chunks)
+
+
 class FileSystemCache:
     """
     Get and cache files from the filesystem.
@@ -82,6 +105,9 @@ class FileSystemCache:
         If the current last modified time cannot be determined for the given
         path, then an `OSError`, or subclass thereof, is raised.
 
+        Only reads from the cache, so it is safe to call from several
+        threads at once (see `MachineGroupSet.update`).
+
         Parameters
         ----------
         path : Path
@@ -209,7 +235,7 @@ class FileSystemCache:
                 return False
 
         if content is None:
-            content = path.read_bytes()
+            content = _read_bytes(path)
         if path_stat is None:
             path_stat = path.stat()
 
@@ -286,10 +312,18 @@ class DataFile:
             cached = self.cache.get(self.path)
             if cached is not None:
                 return cached
-            content = self.path.read_bytes()
+            content = _read_bytes(self.path)
             self.cache.put(self.path, content)
+            return content
+
+        return _read_bytes(self.path)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_template(source: str) -> Template:
+    """Compile the given jinja2 template source, caching the result."""
 
-        return self.path.read_bytes()
+    return Template(source)
 
 
 class JinjaRenderFuncCallable(t.Protocol):
@@ -343,7 +377,7 @@ class DataJinjaTemplate(DataFile):
     def render_jinja(source: str, **context: t.Any) -> str:
         """Render the given jinja2 template using kwargs as vars."""
 
-        return Template(source).render(**context)
+        return _compile_template(source).render(**context)
 
     def jinja_render_func(self, *args, **kwargs) -> str:
         """
@@ -1,23 +1,42 @@
 # -*- coding: utf-8 -*-
 """Representation of machine information."""
+import ast
+import dataclasses
 import functools
 import hashlib
 import logging
+import operator
 import os
 import re
+import sys
+import threading
+import time
+import types
 import typing as t
 from abc import ABC
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
 
 import jinja2
+import jinja2.nodes
 import orjson
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, PrivateAttr, validator
 
 from foremanlite.fsdata import SHA256, DataFile, FileSystemCache
 from foremanlite.logging import DUMB_LOGGER
 
 Mac = t.NewType("Mac", str)
+_BOOL_STRS = frozenset(("true", "false"))
+# Max number of threads MachineGroupSet reads and checks group files with
+_MAX_LOAD_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# How old a directory mtime must be before MachineGroupSet trusts it
+_RACY_MTIME_NS = 2_000_000_000
+# Max number of machines each MachineGroup remembers match results for
+_MATCH_CACHE_SIZE = 4096
+_MATCH_STR_ENV = jinja2.Environment(autoescape=False)
+_MATCH_STR_EVAL_GLOBALS: t.Dict[str, t.Any] = {"__builtins__": {}}
 
 
 class Arch(str, Enum):
@@ -33,6 +52,127 @@ def _orjson_dumps(value, *_, default) -> str:
     return orjson.dumps(value, default=default).decode()
 
 
+@functools.lru_cache(maxsize=256)
+def _compile_match_template(exp: str) -> jinja2.Template:
+    """Compile the given match string template, caching the result."""
+
+    return _MATCH_STR_ENV.from_string(exp)
+
+
+def _match_test_to_ast(node: jinja2.nodes.Node) -> t.Optional[ast.expr]:
+    """Translate a boolean jinja expression into a python expression."""
+
+    if isinstance(node, (jinja2.nodes.And, jinja2.nodes.Or)):
+        left = _match_test_to_ast(node.left)
+        right = _match_test_to_ast(node.right)
+        if left is None or right is None:
+            return None
+        return ast.BoolOp(
+            op=ast.And() if isinstance(node, jinja2.nodes.And) else ast.Or(),
+            values=[left, right],
+        )
+    if isinstance(node, jinja2.nodes.Not):
+        operand = _match_test_to_ast(node.node)
+        if operand is None:
+            return None
+        return ast.UnaryOp(op=ast.Not(), operand=operand)
+    if (
+        isinstance(node, jinja2.nodes.Name)
+        and node.ctx == "load"
+        # globals such as range are truthy rather than undefined, so
+        # leave them to jinja
+        and node.name not in _MATCH_STR_ENV.globals
+    ):
+        return ast.Name(id=node.name, ctx=ast.Load())
+    if isinstance(node, jinja2.nodes.Const) and isinstance(node.value, bool):
+        return ast.Constant(value=node.value)
+    return None
+
+
+def _match_branch_to_ast(
+    body: t.List[jinja2.nodes.Node],
+) -> t.Optional[ast.expr]:
+    """Translate the body of a jinja if block which outputs a boolean."""
+
+    if (
+        len(body) != 1
+        or not isinstance(body[0], jinja2.nodes.Output)
+        or len(body[0].nodes) != 1
+        or not isinstance(body[0].nodes[0], jinja2.nodes.TemplateData)
+    ):
+        return None
+    result = body[0].nodes[0].data.strip().lower()
+    if result not in _BOOL_STRS:
+        return None
+    return ast.Constant(value=result == "true")
+
+
+def _match_if_to_ast(node: jinja2.nodes.If) -> t.Optional[ast.expr]:
+    """Translate a jinja if block whose branches output booleans."""
+
+    orelse = _match_branch_to_ast(node.else_)
+    if orelse is None:
+        return None
+    for branch in reversed([node, *node.elif_]):
+        test = _match_test_to_ast(branch.test)
+        body = _match_branch_to_ast(branch.body)
+        if test is None or body is None:
+            return None
+        orelse = ast.IfExp(test=test, body=body, orelse=orelse)
+    return orelse
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_match_exp(exp: str) -> t.Optional[types.CodeType]:
+    """
+    Compile simple match string templates into python code objects.
+
+    Templates which are just a literal `True`/`False`, or a single
+    if block combining selector names with and/or/not whose branches
+    output `True`/`False`, are translated into an equivalent python
+    expression. This lets them be evaluated without rendering a
+    template. Returns None for any other template.
+
+    Raises
+    ------
+    jinja2.TemplateSyntaxError
+        If the given template cannot be parsed.
+    """
+
+    expression: t.Optional[ast.expr] = None
+    for node in _MATCH_STR_ENV.parse(exp).body:
+        if isinstance(node, jinja2.nodes.Output) and all(
+            isinstance(data, jinja2.nodes.TemplateData) for data in node.nodes
+        ):
+            text = "".join(data.data for data in node.nodes).strip().lower()
+            if len(text) == 0:
+                continue
+            if expression is not None or text not in _BOOL_STRS:
+                return None
+            expression = ast.Constant(value=text == "true")
+        elif isinstance(node, jinja2.nodes.If) and expression is None:
+            expression = _match_if_to_ast(node)
+            if expression is None:
+                return None
+        else:
+            return None
+
+    if expression is None:
+        return None
+    tree = ast.fix_missing_locations(ast.Expression(body=expression))
+    return compile(tree, "<match_str>", "eval")
+
+
+class _MatchStrNamespace(dict):
+    """Namespace for compiled match strings, undefined names are False."""
+
+    __slots__ = ()
+
+    def __missing__(self, key: str) -> bool:
+        # Same as an undefined variable in a jinja if block
+        return False
+
+
 def _validate_str_not_empty(value: str):
     """Pydantic validator to ensure a string is not empty."""
 
@@ -69,6 +209,24 @@ class _MachineStuffsBaseModel(BaseModel):
 
         return _validate_str_not_empty(value)
 
+    def copy(self, *args, **kwargs):
+        model = super().copy(*args, **kwargs)
+        # private attributes only hold what's derived from fields, which
+        # the copy may have changed, so don't carry them over
+        model._init_private_attributes()
+        return model
+
+    def json_bytes(self) -> bytes:
+        """
+        Serialize the model to json, returned as bytes.
+
+        Same as `json`, except orjson's output is handed back as-is
+        rather than being decoded into a str. Useful when the result
+        is immediately written to a socket or the store.
+        """
+
+        return orjson.dumps(self.dict(), default=self.__json_encoder__)
+
 
 class Machine(_MachineStuffsBaseModel):
     """
@@ -95,11 +253,114 @@ class Machine(_MachineStuffsBaseModel):
     name: t.Optional[str] = None
     provision: t.Optional[bool] = None
 
+    # Machines are hashed and compared against selectors constantly, but
+    # are only rarely modified (see __setattr__), so cache the results.
+    _repr: t.Optional[str] = PrivateAttr(default=None)
+    _hash: t.Optional[int] = PrivateAttr(default=None)
+    _uuid: t.Optional[SHA256] = PrivateAttr(default=None)
+    _frozen: t.Optional["FrozenMachine"] = PrivateAttr(default=None)
+
+    @validator("mac")
+    def intern_mac(
+        cls, value: Mac
+    ):  # pylint: disable=no-self-argument,no-self-use
+        """Intern mac, as it is compared against selectors very often."""
+
+        return Mac(sys.intern(str(value)))
+
+    @validator("name")
+    def intern_name(
+        cls, value: t.Optional[str]
+    ):  # pylint: disable=no-self-argument,no-self-use
+        """Intern name, as it is compared against selectors very often."""
+
+        # sys.intern only accepts exact str instances
+        if type(value) is str:  # pylint: disable=unidiomatic-typecheck
+            value = sys.intern(value)
+        return value
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__fields__:
+            self._repr = None
+            self._hash = None
+            self._frozen = None
+            if name in ("mac", "arch"):
+                self._uuid = None
+
+    def __repr__(self) -> str:
+        if self._repr is None:
+            self._repr = super().__repr__()
+        return self._repr
+
     def __eq__(self, other) -> bool:
+        if isinstance(other, Machine):
+            # compares attrs as a tuple, no need to format a repr
+            return self.freeze() == other.freeze()
         return repr(self) == repr(other)
 
     def __hash__(self):
-        return hash(repr(self))
+        if self._hash is None:
+            self._hash = hash(self.freeze())
+        return self._hash
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # str hashes are salted per process, so don't carry ours over
+        state["__private_attribute_values__"].pop("_hash", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._hash = None
+
+    @property
+    def uuid(self) -> SHA256:
+        """Uuid of the machine, see `get_uuid`."""
+
+        if self._uuid is None:
+            self._uuid = get_uuid(mac=self.mac, arch=self.arch)
+        return self._uuid
+
+    def freeze(self) -> "FrozenMachine":
+        """Return an immutable snapshot of the machine, see FrozenMachine."""
+
+        if self._frozen is None:
+            self._frozen = FrozenMachine(
+                mac=self.mac,
+                arch=self.arch,
+                name=self.name,
+                provision=self.provision,
+            )
+        return self._frozen
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FrozenMachine:
+    """
+    Immutable snapshot of a Machine, created with `Machine.freeze`.
+
+    Plain slotted attributes are much cheaper to read and hash than
+    pydantic fields, so machines are frozen before being matched
+    against selectors. See Machine for a description of attributes.
+    """
+
+    mac: Mac
+    arch: Arch
+    name: t.Optional[str] = None
+    provision: t.Optional[bool] = None
+
+    def freeze(self) -> "FrozenMachine":
+        """Return self, so a FrozenMachine can stand in for a Machine."""
+
+        return self
+
+
+AnyMachine = t.Union[Machine, FrozenMachine]
+
+
+# utf-8 encoded values of each Arch, see _uuid_of
+_ARCH_BYTES = {arch.value: arch.value.encode("utf-8") for arch in Arch}
 
 
 def get_uuid(
@@ -121,8 +382,7 @@ def get_uuid(
     """
 
     if machine is not None:
-        mac = machine.mac
-        arch = machine.arch
+        return machine.uuid
 
     if mac is None or arch is None:
         raise ValueError(
@@ -130,14 +390,205 @@ def get_uuid(
             f"is missing (mac={mac}, arch={arch})"
         )
 
-    mac_str = str(Mac(mac))
-    arch_str = str(Arch(arch).value)
+    return _uuid_of(str(Mac(mac)), str(Arch(arch).value))
+
+
+@functools.lru_cache(maxsize=8192)
+def _uuid_of(mac_str: str, arch_str: str) -> SHA256:
+    """Hash the given normalized mac and arch, see `get_uuid`."""
+
+    # same digest as hashing the two concatenated, without building
+    # the concatenated string first
+    hasher = hashlib.sha256(mac_str.encode("utf-8"))
+    hasher.update(_ARCH_BYTES[arch_str])
+    return SHA256(hasher.hexdigest())
+
+
+def _regex_subject(machine: AnyMachine, attr: str) -> str:
+    """Return the string regex selectors on attr are matched against."""
+
+    value = getattr(machine, attr, None)
+    if isinstance(value, Enum):
+        value = value.value
+    return str(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _regex_subject_getter(attr: str) -> t.Callable[[AnyMachine], str]:
+    """
+    Return a function that gives the `_regex_subject` for attr.
+
+    The type of each Machine field is known up front, so the returned
+    function skips checking for Enums and skips the str call where the
+    value is already a str.
+    """
+
+    field = Machine.__fields__.get(attr)
+    if field is None:
+        return functools.partial(_regex_subject, attr=attr)
+    field_type = field.type_
+    is_enum = isinstance(field_type, type) and issubclass(field_type, Enum)
+    getter = operator.attrgetter(f"{attr}.value" if is_enum else attr)
+    # i.e. mac, or arch whose values are str
+    if (
+        not field.allow_none
+        and isinstance(field_type, type)
+        and issubclass(field_type, str)
+    ):
+        return getter
+    return lambda machine: str(getter(machine))
 
-    return SHA256(
-        hashlib.sha256(
-            f"{str(mac_str)}{str(arch_str)}".encode("utf-8")
-        ).hexdigest()
-    )
+
+@functools.lru_cache(maxsize=4096)
+def _compile_regex(pattern: str) -> t.Pattern[str]:
+    """Compile the given regex selector pattern."""
+
+    return re.compile(pattern)
+
+
+def _combine_regex_patterns(
+    patterns: t.Sequence[str],
+) -> t.Optional[t.Pattern[str]]:
+    """
+    Combine regex patterns into one alternation matching if any of them do.
+
+    Returns None if the patterns cannot be safely combined, i.e. if one
+    of them has capture groups (which backreferences may point to) or
+    global inline flags, or if there is nothing to combine.
+    """
+
+    if len(patterns) < 2:
+        return None
+    default_flags = _compile_regex("").flags
+    for pattern in patterns:
+        compiled = _compile_regex(pattern)
+        if compiled.groups != 0 or compiled.flags != default_flags:
+            return None
+    try:
+        return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+    except re.error:
+        return None
+
+
+def _build_exact_matcher(
+    vals: t.Sequence[t.Any], attr: str
+) -> t.Callable[[AnyMachine], bool]:
+    """Return function checking if a machine's attr equals one of vals."""
+
+    if attr in Machine.__fields__:
+        # Machine and FrozenMachine always have these attrs set, so
+        # attrgetter can be used, which is cheaper than getattr
+        getter = operator.attrgetter(attr)
+        if len(vals) == 1:
+            val = vals[0]
+
+            def _exact_field_matches(machine: AnyMachine) -> bool:
+                return getter(machine) == val
+
+            return _exact_field_matches
+
+        field_vals: t.Collection[t.Any]
+        try:
+            # Machine field values are hashable, so with hashable vals
+            # this is one set lookup rather than a compare per val
+            field_vals = frozenset(vals)
+        except TypeError:
+            field_vals = tuple(vals)
+
+        def _exact_field_matches_any(machine: AnyMachine) -> bool:
+            return getter(machine) in field_vals
+
+        return _exact_field_matches_any
+
+    if len(vals) == 1:
+        val = vals[0]
+
+        def _exact_matches(machine: AnyMachine) -> bool:
+            return getattr(machine, attr, None) == val
+
+        return _exact_matches
+
+    vals = tuple(vals)
+
+    def _exact_matches_any(machine: AnyMachine) -> bool:
+        return getattr(machine, attr, None) in vals
+
+    return _exact_matches_any
+
+
+def _build_regex_matcher(
+    patterns: t.Sequence[t.Pattern[str]], attr: str
+) -> t.Callable[[AnyMachine], bool]:
+    """
+    Return function checking if a machine's attr matches one of patterns.
+
+    The attr is only looked up once per machine, no matter how many
+    patterns there are.
+    """
+
+    subject = _regex_subject_getter(attr)
+    if len(patterns) == 1:
+        match = patterns[0].match
+
+        def _regex_matches(machine: AnyMachine) -> bool:
+            return match(subject(machine)) is not None
+
+        return _regex_matches
+
+    matches = tuple(pattern.match for pattern in patterns)
+
+    def _regex_matches_any(machine: AnyMachine) -> bool:
+        value = subject(machine)
+        for match in matches:
+            if match(value) is not None:
+                return True
+        return False
+
+    return _regex_matches_any
+
+
+class _RegexIndexEntry(t.NamedTuple):
+    """
+    Regex selector patterns used on one attr, with the groups using them.
+
+    `prefilter` is an alternation of all the patterns, letting a machine
+    which matches none of them be ruled out with a single regex match.
+    It is None if the patterns cannot be combined, see
+    _combine_regex_patterns.
+    """
+
+    subject: t.Callable[[AnyMachine], str]
+    prefilter: t.Optional[t.Pattern[str]]
+    patterns: t.Tuple[t.Tuple[t.Pattern[str], t.Tuple[int, ...]], ...]
+
+    @classmethod
+    def from_patterns(
+        cls, attr: str, patterns: t.Dict[str, t.List[int]]
+    ) -> "_RegexIndexEntry":
+        """Create an entry for attr from a mapping of pattern to groups."""
+
+        compiled = tuple(
+            (_compile_regex(pattern), tuple(group_idxs))
+            for pattern, group_idxs in patterns.items()
+        )
+        return cls(
+            subject=_regex_subject_getter(attr),
+            prefilter=_combine_regex_patterns(list(patterns)),
+            patterns=compiled,
+        )
+
+    def match(self, machine: AnyMachine, found: t.Set[int]):
+        """Add the groups with a pattern matching the machine to found."""
+
+        subject = self.subject(machine)
+        if (
+            self.prefilter is not None
+            and self.prefilter.match(subject) is None
+        ):
+            return
+        for pattern, group_idxs in self.patterns:
+            if pattern.match(subject) is not None:
+                found.update(group_idxs)
 
 
 class MachineSelectorType(str, Enum):
@@ -169,15 +620,21 @@ class MachineSelector(ABC, _MachineStuffsBaseModel):
     val: t.Any
     name: t.Optional[str] = None
 
+    # see _get_matcher
+    _matcher: t.Optional[t.Callable[[AnyMachine], bool]] = PrivateAttr(
+        default=None
+    )
+
     class Config(_MachineStuffsBaseModelConfig):
         """
         pydantic configuration
 
         We set smart_union to help with determining type
-        of val.
+        of val. Selectors are immutable, as their matcher is cached.
         """
 
         smart_union = True
+        allow_mutation = False
 
     @validator("val")
     def pattern_given_when_type_is_regex(
@@ -191,6 +648,18 @@ class MachineSelector(ABC, _MachineStuffsBaseModel):
             value = str(value)
         return value
 
+    @validator("val")
+    def intern_str_val(
+        cls, value
+    ):  # pylint: disable=no-self-argument,no-self-use
+        """Intern string values, making equality checks against them cheap."""
+
+        # sys.intern only accepts exact str instances, not subclasses
+        # such as Arch
+        if type(value) is str:  # pylint: disable=unidiomatic-typecheck
+            value = sys.intern(value)
+        return value
+
     @validator("attr", "val")
     def is_not_empty_string(
         cls, value: str
@@ -199,23 +668,70 @@ class MachineSelector(ABC, _MachineStuffsBaseModel):
 
         return _validate_str_not_empty(value)
 
-    def _exact_matches(self, machine: Machine) -> bool:
-        """Determine if the machine has the exact expected value."""
+    @validator("val")
+    def regex_val_compiles(
+        cls, value, values
+    ):  # pylint: disable=no-self-argument,no-self-use
+        """Assert regex vals compile, caching them for when matching."""
+
+        if values.get("type") == MachineSelectorType.regex:
+            try:
+                _compile_regex(value)
+            except re.error as err:
+                raise ValueError(
+                    f"Invalid regex given: {repr(value)}: {err}"
+                ) from err
+        return value
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # closures cannot be pickled, they are cheap to build again
+        state["__private_attribute_values__"].pop("_matcher", None)
+        return state
 
-        attr = getattr(machine, self.attr, None)
-        return attr == self.val
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._matcher = None
 
-    def _regex_matches(self, machine: Machine) -> bool:
-        """Determine if machine has attr which matches set regex string."""
+    def _exact_matcher(self) -> t.Callable[[AnyMachine], bool]:
+        """Return function checking if a machine has the expected value."""
 
-        attr = getattr(machine, self.attr, None)
-        if isinstance(attr, Enum):
-            attr = attr.value
-        attr = str(attr)
+        return _build_exact_matcher([self.val], self.attr)
 
-        return re.compile(self.val).match(attr) is not None
+    def _regex_matcher(self) -> t.Callable[[AnyMachine], bool]:
+        """Return function checking if a machine's attr matches the regex."""
 
-    def matches(self, machine: Machine) -> bool:
+        return _build_regex_matcher([_compile_regex(self.val)], self.attr)
+
+    def _get_matcher(self) -> t.Callable[[AnyMachine], bool]:
+        """
+        Return function checking machines against this selector.
+
+        Built once per selector, so matches does not need to look at the
+        selector's type or re-fetch its compiled regex on every call.
+
+        Raises
+        ------
+        ValueError
+            if an invalid MachineSelectorType was given.
+        """
+
+        matcher = self._matcher
+        if matcher is None:
+            if self.type is MachineSelectorType.exact:
+                matcher = self._exact_matcher()
+            elif self.type is MachineSelectorType.regex:
+                matcher = self._regex_matcher()
+            else:
+                raise ValueError(
+                    f"Invalid match type given {self.type} "
+                    "(expected one of "
+                    f"{', '.join([m.value for m in MachineSelectorType])})"
+                )
+            self._matcher = matcher
+        return matcher
+
+    def matches(self, machine: AnyMachine) -> bool:
         """
         Return if the given machine matches the selector.
 
@@ -225,14 +741,37 @@ class MachineSelector(ABC, _MachineStuffsBaseModel):
             if an invalid MachineSelectorType was given.
         """
 
-        match_method = getattr(self, f"_{str(self.type.value)}_matches", None)
-        if match_method is None:
-            raise ValueError(
-                f"Invalid match type given {self.type} "
-                "(expected one of "
-                f"{', '.join([m.value for m in MachineSelectorType])})"
-            )
-        return match_method(machine)
+        return self._get_matcher()(machine)
+
+
+class _LazySelectorNamespace(_MatchStrNamespace):
+    """
+    Namespace which only checks a selector once its name is looked up.
+
+    Lets compiled match strings short-circuit, i.e. for `a or b`
+    selector `b` is never checked if selector `a` matches.
+    """
+
+    __slots__ = ("machine", "selectors")
+
+    def __init__(
+        self, machine: AnyMachine, selectors: t.Dict[str, MachineSelector]
+    ):
+        super().__init__()
+        self.machine = machine
+        self.selectors = selectors
+
+    def __missing__(self, key: str) -> bool:
+        selector = self.selectors.get(key)
+        if selector is None:
+            return False
+        result = self[key] = selector.matches(self.machine)
+        return result
+
+    def resolve(self) -> t.Dict[str, bool]:
+        """Check every selector, returning the result for each name."""
+
+        return {name: self[name] for name in self.selectors}
 
 
 class SelectorMatchStr(_MachineStuffsBaseModel):
@@ -256,14 +795,56 @@ class SelectorMatchStr(_MachineStuffsBaseModel):
 
     exp: str
 
-    def test(self, selector_values: t.Dict[str, bool]) -> bool:
+    # compiled forms of exp, see _get_code and _get_template
+    _code: t.Optional[types.CodeType] = PrivateAttr(default=None)
+    _code_compiled: bool = PrivateAttr(default=False)
+    _template: t.Optional[jinja2.Template] = PrivateAttr(default=None)
+
+    class Config(_MachineStuffsBaseModelConfig):
+        """
+        pydantic configuration
+
+        Match strings are immutable, as their compiled forms are cached.
+        """
+
+        allow_mutation = False
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # code objects cannot be pickled, they are cheap to look up again
+        for name in ("_code", "_code_compiled", "_template"):
+            state["__private_attribute_values__"].pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._code = None
+        self._code_compiled = False
+        self._template = None
+
+    def _get_code(self) -> t.Optional[types.CodeType]:
+        """Return exp compiled to python, if possible."""
+
+        if not self._code_compiled:
+            self._code = _compile_match_exp(self.exp)
+            self._code_compiled = True
+        return self._code
+
+    def _get_template(self) -> jinja2.Template:
+        """Return exp compiled as a jinja template."""
+
+        if self._template is None:
+            self._template = _compile_match_template(self.exp)
+        return self._template
+
+    def test(self, selector_values: t.Mapping[str, bool]) -> bool:
         """
         Test the expression against the given selector values.
 
         Parameters
         ----------
-        selector_values : dict mapping str to bool
-            Dict defining values to use for each expected selector.
+        selector_values : mapping of str to bool
+            Mapping defining values to use for each expected selector.
 
         Raises
         ------
@@ -271,27 +852,44 @@ class SelectorMatchStr(_MachineStuffsBaseModel):
             If the template resolved to a value other than `True` or `False`
         """
 
-        result = (
-            jinja2.Template(self.exp).render(**selector_values).lower().strip()
-        )
-        if result.lower() == "true":
+        code = self._get_code()
+        if code is not None:
+            if not isinstance(selector_values, _MatchStrNamespace):
+                selector_values = _MatchStrNamespace(selector_values)
+            return bool(
+                eval(  # pylint: disable=eval-used
+                    code, _MATCH_STR_EVAL_GLOBALS, selector_values
+                )
+            )
+        if isinstance(selector_values, _LazySelectorNamespace):
+            selector_values = selector_values.resolve()
+
+        result = self._get_template().render(**selector_values)
+        # templates usually output exactly one of these
+        if result == "True":
             return True
-        if result.lower() == "false":
+        if result == "False":
             return False
+        result = result.strip().lower()
+        if result in _BOOL_STRS:
+            return result == "true"
         raise ValueError(
             "Unexpected template output, expected 'True' or 'False': "
             f"{repr(result)}"
         )
 
     def apply(
-        self, machine: Machine, selectors: t.List[MachineSelector]
+        self, machine: AnyMachine, selectors: t.List[MachineSelector]
     ) -> bool:
         """
         Apply the match string onto the given machine.
 
+        Selectors are only checked against the machine once the
+        expression needs their value.
+
         Parameters
         ----------
-        machine : Machine
+        machine : Machine or FrozenMachine
             machine to apply the expression to.
         selectors : list of MachineSelector
             selectors to substitute into the set expression
@@ -302,16 +900,16 @@ class SelectorMatchStr(_MachineStuffsBaseModel):
             If one of the given selectors does not have a name set.
         """
 
-        namespace: t.Dict[str, bool] = {}
+        named: t.Dict[str, MachineSelector] = {}
         for selector in selectors:
             if selector.name is None:
                 raise ValueError(
                     f"Given selector {selector.dict()} has no name, "
                     "unable to continue"
                 )
-            namespace[selector.name] = selector.matches(machine)
+            named[selector.name] = selector
 
-        return self.test(namespace)
+        return self.test(_LazySelectorNamespace(machine, named))
 
 
 class MachineGroup(_MachineStuffsBaseModel):
@@ -333,7 +931,7 @@ class MachineGroup(_MachineStuffsBaseModel):
     ----------
     name : str
         Name representing this machine group
-    selectors : list of MachineSelector
+    selectors : tuple of MachineSelector
         MachineSelectors that describe this group.
     vars : dict, optional
         Variables to associate with this group.
@@ -343,32 +941,79 @@ class MachineGroup(_MachineStuffsBaseModel):
     path : Path, optional
         Location to file where this group was loaded from,
         if applicable.
+
+    Notes
+    -----
+    Match results are cached, so groups, their selectors and their
+    match string cannot be changed once created. Use `copy(update=...)`
+    to get a changed group instead.
     """
 
-    selectors: t.List[MachineSelector]
+    selectors: t.Tuple[MachineSelector, ...]
     name: str
     vars: t.Optional[t.Dict[str, t.Any]] = None
     match_str: t.Optional[SelectorMatchStr] = None
     path: t.Optional[Path] = None
 
+    # sha256 of the file content this group was parsed from, if applicable
+    _content_sha256: t.Optional[SHA256] = PrivateAttr(default=None)
+    # results of matches, keyed by the machine that was checked
+    # (an OrderedDict, as its popitem lets threads evict safely at once)
+    _match_cache: t.OrderedDict["FrozenMachine", bool] = PrivateAttr(
+        default_factory=OrderedDict
+    )
+    # see _get_checks
+    _checks: t.Optional[
+        t.Tuple[
+            t.Tuple[t.Callable[[AnyMachine], bool], ...],
+            t.Dict[str, MachineSelector],
+        ]
+    ] = PrivateAttr(default=None)
+
+    class Config(_MachineStuffsBaseModelConfig):
+        """
+        pydantic configuration
+
+        Groups are immutable, as what they match is cached.
+        """
+
+        allow_mutation = False
+
     def __hash__(self):
         return hash(repr(self))
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        # closures cannot be pickled
+        state["__private_attribute_values__"].pop("_checks", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._checks = None
+
     @classmethod
     def from_path(
         cls,
         path: Path,
         logger: logging.Logger,
         cache: t.Optional[FileSystemCache],
+        previous: t.Optional["MachineGroup"] = None,
     ) -> "MachineGroup":
         """
         Parse the given machine group file into a MachineGroup instance.
 
+        If `previous` is given and was parsed from the same content as
+        what is currently in the file, then `previous` is returned as-is
+        and the file is not parsed again.
+
         Parameters
         ----------
         path : Path
         logger : logging.Logger
         cache : FileSystemCache, optional
+        previous : MachineGroup, optional
+            Group previously parsed from the given path.
 
         Raises
         ------
@@ -384,9 +1029,20 @@ class MachineGroup(_MachineStuffsBaseModel):
         """
 
         try:
-            content = DataFile(path, cache=cache).read().decode("utf-8")
-            group = MachineGroup.parse_raw(content)
-            group.path = path
+            content = DataFile(path, cache=cache).read()
+            content_sha256 = FileSystemCache.compute_sha256(content)
+            if (
+                previous is not None
+                and previous._content_sha256 == content_sha256
+            ):
+                return previous
+            # orjson parses bytes directly, no need to decode first
+            obj = orjson.loads(content)
+            if isinstance(obj, dict):
+                # groups are immutable, so path is given when parsing
+                obj = {**obj, "path": path}
+            group = MachineGroup.parse_obj(obj)
+            group._content_sha256 = content_sha256
             return group
         except (OSError, ValueError) as err:
             logger.error("Unable to parse group file %s: %s", path, err)
@@ -404,43 +1060,79 @@ class MachineGroup(_MachineStuffsBaseModel):
             )
         return value
 
-    @staticmethod
-    @functools.cache
-    def _matches(group: "MachineGroup", machine: Machine) -> bool:
-        if group.match_str is None:
-            for selector in group.selectors:
-                if selector.matches(machine):
-                    return True
-        else:
-            named = []
-            for selector in group.selectors:
-                if selector.name is None and selector.matches(machine):
-                    return True
-                named.append(selector)
-            return group.match_str.apply(machine, named)
+    def _get_checks(
+        self,
+    ) -> t.Tuple[
+        t.Tuple[t.Callable[[AnyMachine], bool], ...],
+        t.Dict[str, MachineSelector],
+    ]:
+        """
+        Return checks or-ed together by _matches, and named selectors.
+
+        Selectors are or-ed together, unless a match string is set and
+        they are named, in which case they are handed to the match string
+        by name instead. Or-ed selectors are bucketed by attr, so each
+        attr is looked up once per machine, with exact buckets checked
+        first as they are cheapest. Regex selectors on the same attr are
+        combined into one alternation where possible, so a machine is
+        checked against all of them with a single regex match.
+        """
 
-        return False
+        checks = self._checks
+        if checks is None:
+            exact: t.Dict[str, t.List[t.Any]] = {}
+            regex: t.Dict[str, t.List[str]] = {}
+            named: t.Dict[str, MachineSelector] = {}
+            for selector in self.selectors:
+                if self.match_str is not None and selector.name is not None:
+                    named[selector.name] = selector
+                elif selector.type is MachineSelectorType.regex:
+                    regex.setdefault(selector.attr, []).append(selector.val)
+                else:
+                    exact.setdefault(selector.attr, []).append(selector.val)
+            or_checks = [
+                _build_exact_matcher(vals, attr)
+                for attr, vals in exact.items()
+            ]
+            for attr, patterns in regex.items():
+                combined = _combine_regex_patterns(patterns)
+                or_checks.append(
+                    _build_regex_matcher(
+                        [_compile_regex(pattern) for pattern in patterns]
+                        if combined is None
+                        else [combined],
+                        attr,
+                    )
+                )
+            checks = self._checks = (tuple(or_checks), named)
+        return checks
+
+    def _matches(self, machine: FrozenMachine) -> bool:
+        or_checks, named = self._get_checks()
+        for check in or_checks:
+            if check(machine):
+                return True
+        if self.match_str is None:
+            return False
+        return self.match_str.test(_LazySelectorNamespace(machine, named))
 
-    def matches(self, machine: Machine) -> bool:
+    def matches(self, machine: AnyMachine) -> bool:
         """Return if the given machine belongs to this group."""
 
-        return self._matches(self, machine)
-
-    @staticmethod
-    @functools.cache
-    def _filter(
-        group: "MachineGroup",
-        machines: t.Tuple[Machine],  # must to tuple to stay hashable
-    ) -> t.List[Machine]:
-
-        matches = []
-        for machine in machines:
-            if group.matches(machine):
-                matches.append(machine)
-
-        return matches
+        frozen = machine.freeze()
+        cache = self._match_cache
+        result = cache.get(frozen)
+        if result is None:
+            if len(cache) >= _MATCH_CACHE_SIZE:
+                # drop the oldest entry, unless another thread beat us
+                try:
+                    cache.popitem(last=False)
+                except KeyError:
+                    pass
+            result = cache[frozen] = self._matches(frozen)
+        return result
 
-    def filter(self, machines: t.Iterable[Machine]) -> t.List[Machine]:
+    def filter(self, machines: t.Iterable[Machine]) -> t.Set[Machine]:
         """
         Filter the given iterable of Machines.
 
@@ -451,12 +1143,13 @@ class MachineGroup(_MachineStuffsBaseModel):
 
         Returns
         -------
-        list of machine
-            List of machines from the given iterable that were matched
-            into the group.
+        set of machine
+            Set of machines from the given iterable that were matched
+            into the group. Machines given more than once are only
+            included once.
         """
 
-        return self._filter(self, tuple(machines))
+        return {machine for machine in machines if self.matches(machine)}
 
 
 class MachineGroupSet(_MachineStuffsBaseModel):
@@ -472,15 +1165,44 @@ class MachineGroupSet(_MachineStuffsBaseModel):
         have changed on disk.
     groups_dir : Path, optional
         Directory where group files are pulled from (recursively).
+
+    Notes
+    -----
+    `filter` uses an index of the groups, which is rebuilt whenever
+    `groups` is replaced or changed in place. Groups themselves are
+    immutable, see `MachineGroup`.
     """
 
     groups: t.List[MachineGroup]
     cache: t.Optional[FileSystemCache]
     groups_dir: t.Optional[Path]
 
+    # see _GroupIndex, built on first use of filter
+    _index: t.Optional["_GroupIndex"] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    # time.monotonic() of when update last checked for changes
+    _last_update: t.Optional[float] = PrivateAttr(default=None)
+    # directories searched for group files the last time around, see
+    # _search_group_files
+    _dir_mtimes: t.Dict[Path, t.Optional[int]] = PrivateAttr(
+        default_factory=dict
+    )
+
     def __hash__(self):
         return hash(repr(self))
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        # locks cannot be pickled, and the index is cheap to rebuild
+        state["__private_attribute_values__"].pop("_lock", None)
+        state["__private_attribute_values__"].pop("_index", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._lock = threading.Lock()
+        self._index = None
+
     @staticmethod
     def find_group_files(
         groups_dir: Path, logger: logging.Logger
@@ -503,28 +1225,69 @@ class MachineGroupSet(_MachineStuffsBaseModel):
         list of paths
         """
 
-        group_files: t.List[Path] = []
-        # https://www.sethserver.com/python/recursively-list-files.html
-        queue_dir: t.List[t.Union[Path, str]] = [groups_dir]
-        is_json = lambda f: str(f).endswith(".json")
+        return MachineGroupSet._search_group_files(groups_dir, logger)[0]
 
-        def on_error(err: OSError):
-            logger.warning(
-                "Error occurred while looking for group files: %s", err
-            )
+    @staticmethod
+    def _search_group_files(
+        groups_dir: Path, logger: logging.Logger
+    ) -> t.Tuple[t.List[Path], t.Dict[Path, t.Optional[int]]]:
+        """
+        Implement find_group_files, also returning searched directories.
+
+        Directories are mapped to their mtime from before they were
+        searched, see `_dirs_changed`.
+        """
 
         logger.info("Looking for group files in %s", groups_dir)
-        while len(queue_dir) > 0:
-            for (path, dirs, files) in os.walk(
-                queue_dir.pop(), onerror=on_error
-            ):
-                queue_dir.extend(dirs)
-                files = [file for file in files if is_json(file)]
-                group_files.extend(
-                    [Path(os.path.join(path, file)) for file in files]
+        group_files = []
+        dir_mtimes: t.Dict[Path, t.Optional[int]] = {}
+        dirs = [groups_dir]
+        while dirs:
+            current_dir = dirs.pop()
+            dir_mtimes[current_dir] = None
+            try:
+                mtime = current_dir.stat().st_mtime_ns
+                # DirEntry caches stat results, unlike Path.rglob + is_file
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(Path(entry.path))
+                        elif entry.name.endswith(".json") and entry.is_file():
+                            group_files.append(Path(entry.path))
+            except OSError as err:
+                logger.warning(
+                    "Error occurred while looking for group files: %s", err
                 )
+                continue
+            # On filesystems with coarse timestamps, a file added right
+            # after the search may leave the mtime as is, so don't rely
+            # on recent mtimes
+            if time.time_ns() - mtime > _RACY_MTIME_NS:
+                dir_mtimes[current_dir] = mtime
+
+        return group_files, dir_mtimes
 
-        return group_files
+    @staticmethod
+    def _dirs_changed(dir_mtimes: t.Dict[Path, t.Optional[int]]) -> bool:
+        """
+        Return if any of the given directories may have new group files.
+
+        Adding, removing or renaming an entry updates the mtime of the
+        directory holding it, so a directory tree where none of the
+        mtimes changed holds the same group files as before.
+        """
+
+        if not dir_mtimes:
+            return True
+        for path, mtime in dir_mtimes.items():
+            if mtime is None:
+                return True
+            try:
+                if path.stat().st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
 
     @classmethod
     def from_dir(
@@ -558,20 +1321,30 @@ class MachineGroupSet(_MachineStuffsBaseModel):
             if unable to read group file
         """
 
-        groups = []
-        group_files = cls.find_group_files(groups_dir, logger)
+        group_files, dir_mtimes = cls._search_group_files(groups_dir, logger)
 
-        for group_file in group_files:
+        def load(group_file: Path) -> MachineGroup:
             # MachineGroup.from_path has error-handling
-            groups.append(
-                MachineGroup.from_path(
-                    path=group_file, cache=cache, logger=logger
-                )
+            return MachineGroup.from_path(
+                path=group_file, cache=cache, logger=logger
             )
 
-        return cls(groups=groups, groups_dir=groups_dir, cache=cache)
-
-    def update(self, logger: t.Optional[logging.Logger] = None) -> int:
+        # Reading group files is mostly waiting on disk, so overlap it.
+        # map hands back groups in order and raises the first error.
+        max_workers = min(_MAX_LOAD_WORKERS, len(group_files)) or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            groups = list(executor.map(load, group_files))
+
+        group_set = cls(groups=groups, groups_dir=groups_dir, cache=cache)
+        group_set._dir_mtimes = dir_mtimes
+        return group_set
+
+    def update(
+        self,
+        logger: t.Optional[logging.Logger] = None,
+        wait: bool = True,
+        min_interval: float = 0.0,
+    ) -> int:
         """
         Check if any of the known groups have changed, updating if so.
 
@@ -585,6 +1358,13 @@ class MachineGroupSet(_MachineStuffsBaseModel):
         Parameters
         ----------
         logger : logging.Logger
+        wait : bool, optional
+            If another thread is already updating the groups, wait for
+            it to finish and then check again (the default). If False,
+            return right away instead, leaving it to the other thread.
+        min_interval : float, optional
+            Skip checking for changes if the groups were last checked
+            less than this many seconds ago.
 
         Returns
         -------
@@ -606,10 +1386,46 @@ class MachineGroupSet(_MachineStuffsBaseModel):
             )
             return 0
 
+        last_update = self._last_update
+        if (
+            last_update is not None
+            and time.monotonic() - last_update < min_interval
+        ):
+            return 0
+
+        # Requests served on different threads may update at once
+        if not self._lock.acquire(blocking=wait):
+            logger.debug("Groups are already being updated, skipping")
+            return 0
+        try:
+            # filter reads groups without the lock, so changes are made
+            # to a copy which then replaces groups in one go
+            groups = list(self.groups)
+            try:
+                num_updated = self._update(groups, self.cache, logger)
+            finally:
+                # keep partial updates, their files won't be dirty again
+                if len(groups) != len(self.groups) or any(
+                    new is not old for new, old in zip(groups, self.groups)
+                ):
+                    self.groups = groups
+            # only once the update succeeded, so failures are retried
+            self._last_update = time.monotonic()
+            return num_updated
+        finally:
+            self._lock.release()
+
+    def _update(
+        self,
+        groups: t.List[MachineGroup],
+        cache: FileSystemCache,
+        logger: logging.Logger,
+    ) -> int:
         # Update existing groups
         num_updates = 0
-        known_paths: t.List[Path] = []
-        for i, group in enumerate(self.groups):
+        known_paths: t.Set[Path] = set()
+        to_check: t.List[t.Tuple[int, Path]] = []
+        for i, group in enumerate(groups):
             if group.path is None:
                 logger.warning(
                     "Unable to check if group has been updated, as "
@@ -617,17 +1433,44 @@ class MachineGroupSet(_MachineStuffsBaseModel):
                     group.name,
                 )
                 continue
-            known_paths.append(group.path)
-            if self.cache.is_dirty(group.path):
-                self.groups[i] = MachineGroup.from_path(
-                    group.path, cache=self.cache, logger=logger
-                )
+            known_paths.add(group.path)
+            to_check.append((i, group.path))
+
+        # Checking group files is mostly waiting on stat, so overlap it.
+        # map hands back results in order and raises the first error.
+        paths = [path for _, path in to_check]
+        if len(paths) > 1:
+            max_workers = min(_MAX_LOAD_WORKERS, len(paths))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                dirty = list(executor.map(cache.is_dirty, paths))
+        else:
+            dirty = [cache.is_dirty(path) for path in paths]
+
+        for (i, path), is_dirty in zip(to_check, dirty):
+            if not is_dirty:
+                continue
+            group = groups[i]
+            updated = MachineGroup.from_path(
+                path,
+                cache=cache,
+                logger=logger,
+                previous=group,
+            )
+            if updated is group:
                 logger.debug(
-                    "Updated group: name: %s, path: %s",
+                    "Group file was modified but its content is the "
+                    "same, skipping: name: %s, path: %s",
                     group.name,
-                    repr(str(group.path)),
+                    repr(str(path)),
                 )
-                num_updates += 1
+                continue
+            groups[i] = updated
+            logger.debug(
+                "Updated group: name: %s, path: %s",
+                group.name,
+                repr(str(path)),
+            )
+            num_updates += 1
 
         # Find new groups
         if self.groups_dir is None:
@@ -635,20 +1478,31 @@ class MachineGroupSet(_MachineStuffsBaseModel):
                 "Unable to check for new groups, as source dir is not set"
             )
             return num_updates
-        group_files = [
-            path
-            for path in self.find_group_files(self.groups_dir, logger)
-            if path not in known_paths
-        ]
+        if not self._dirs_changed(self._dir_mtimes):
+            # no group files were added, removed or renamed since the
+            # last search
+            return num_updates
+        group_files, dir_mtimes = self._search_group_files(
+            self.groups_dir, logger
+        )
+        group_files = [path for path in group_files if path not in known_paths]
         for group_file in group_files:
-            group = MachineGroup.from_path(group_file, logger, self.cache)
-            self.groups.append(group)
+            try:
+                group = MachineGroup.from_path(group_file, logger, cache)
+            except (OSError, ValueError):
+                # Fixing the file in place leaves its directory's mtime
+                # as is, so make sure the next update searches it again
+                dir_mtimes[group_file.parent] = None
+                self._dir_mtimes = dir_mtimes
+                raise
+            groups.append(group)
             logger.debug(
                 "Added group: name: %s, path: %s",
                 group.name,
                 repr(str(group.path)),
             )
             num_updates += 1
+        self._dir_mtimes = dir_mtimes
 
         return num_updates
 
@@ -657,18 +1511,39 @@ class MachineGroupSet(_MachineStuffsBaseModel):
 
         return self.groups
 
+    def _get_index(self) -> "_GroupIndex":
+        """Return the index of the current groups, building it if needed."""
+
+        index = self._index
+        groups = self.groups
+        if (
+            index is None
+            # groups may be replaced, or changed in place
+            or len(index.groups) != len(groups)
+            or not all(map(operator.is_, index.groups, groups))
+        ):
+            index = self._index = _GroupIndex.from_groups(groups)
+        return index
+
     @staticmethod
-    @functools.cache
     def _filter(
-        group_set: "MachineGroupSet", machine: Machine
+        machine: FrozenMachine, index: "_GroupIndex"
     ) -> t.List[MachineGroup]:
+        exact_index = index.exact
 
-        result = []
-        for group in group_set.groups:
-            if group.matches(machine):
-                result.append(group)
+        found = set()
+        for attr in index.exact_attrs:
+            found.update(
+                exact_index.get((attr, getattr(machine, attr, None)), ())
+            )
+        for entry in index.regex:
+            entry.match(machine, found)
+        groups = index.groups
+        for i in index.unindexed:
+            if i not in found and groups[i].matches(machine):
+                found.add(i)
 
-        return result
+        return [groups[i] for i in sorted(found)]
 
     def filter(self, machine: Machine) -> t.List[MachineGroup]:
         """
@@ -685,4 +1560,94 @@ class MachineGroupSet(_MachineStuffsBaseModel):
             List of all the MachineGroups that the given Machine belongs to.
         """
 
-        return self._filter(self, machine)
+        return self._filter(machine.freeze(), self._get_index())
+
+    def filter_many(
+        self, machines: t.Iterable[Machine]
+    ) -> t.List[t.List[MachineGroup]]:
+        """
+        Return the groups each of the given machines belongs to.
+
+        Same as calling `filter` for each machine, except the index of
+        the groups is only looked up once.
+
+        Parameters
+        ----------
+        machines : iterable of Machine
+            Machines to find group membership of.
+
+        Returns
+        -------
+        list of list of MachineGroup
+            Groups each machine belongs to, in the same order as the
+            given machines.
+        """
+
+        index = self._get_index()
+        return [self._filter(machine.freeze(), index) for machine in machines]
+
+
+class _GroupIndex(t.NamedTuple):
+    """
+    Index of groups used by MachineGroupSet.filter.
+
+    Groups which match a machine whenever one of their selectors does
+    are indexed: exact selectors by (attr, val), regex selectors by
+    attr, see _RegexIndexEntry. Every other group is listed by index
+    in `unindexed` and checked one by one.
+    """
+
+    groups: t.List[MachineGroup]  # copy of the list indexed
+    exact: t.Dict[t.Tuple[str, t.Any], t.List[int]]
+    exact_attrs: t.Tuple[str, ...]
+    regex: t.Tuple[_RegexIndexEntry, ...]
+    unindexed: t.Tuple[int, ...]
+
+    @classmethod
+    def from_groups(cls, groups: t.List[MachineGroup]) -> "_GroupIndex":
+        """Index the given groups."""
+
+        exact_index: t.Dict[t.Tuple[str, t.Any], t.List[int]] = {}
+        regex_patterns: t.Dict[str, t.Dict[str, t.List[int]]] = {}
+        unindexed_groups = []
+        for i, group in enumerate(groups):
+            exact_keys = []
+            regex_keys = []
+            # the match string may match a machine no selector matches
+            indexable = group.match_str is None
+            for selector in group.selectors:
+                if group.match_str is not None and selector.name is not None:
+                    # combined with other selectors by the match string
+                    continue
+                if selector.type == MachineSelectorType.regex:
+                    regex_keys.append((selector.attr, selector.val))
+                    continue
+                if selector.type != MachineSelectorType.exact:
+                    indexable = False
+                    continue
+                try:
+                    hash(selector.val)
+                except TypeError:
+                    indexable = False
+                    continue
+                exact_keys.append((selector.attr, selector.val))
+
+            for key in exact_keys:
+                exact_index.setdefault(key, []).append(i)
+            for attr, pattern in regex_keys:
+                regex_patterns.setdefault(attr, {}).setdefault(
+                    pattern, []
+                ).append(i)
+            if not indexable:
+                unindexed_groups.append(i)
+
+        return cls(
+            groups=list(groups),
+            exact=exact_index,
+            exact_attrs=tuple({attr for attr, _ in exact_index}),
+            regex=tuple(
+                _RegexIndexEntry.from_patterns(attr, patterns)
+                for attr, patterns in regex_patterns.items()
+            ),
+            unindexed=tuple(unindexed_groups),
+        )
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 """Configure variables for flask startup."""
 import os
+import runpy
 import typing as t
 from pathlib import Path
 
@@ -14,6 +15,7 @@ from foremanlite.logging import BASENAME
 from foremanlite.logging import get as get_logger
 from foremanlite.serve.context import ServeContext, get_context, set_context
 from foremanlite.serve.routes import register_routes
+from foremanlite.serve.util import warm_templates
 from foremanlite.vars import (
     GUNICORN_CONFIG,
     GUNICORN_DEFAULT_CONFIG,
@@ -32,7 +34,13 @@ def get_app() -> Flask:
 
 
 def set_app(app: Flask):
-    """Set the current app to the given Flask instance."""
+    """
+    Set the current app to the given Flask instance.
+
+    Gunicorn workers are forked from the process which ran `setup`
+    (see `ForemanliteGunicornApp.load_config`), so this should not be
+    called again from worker hooks.
+    """
 
     global _APP
     _APP = app
@@ -81,6 +89,10 @@ def setup(
     if config is not None:
         set_context(ServeContext.from_config(config))
 
+    if ctx is not None or config is not None:
+        num_warmed = warm_templates(app, get_context(), _logger)
+        _logger.info(f"Compiled {num_warmed} templates ahead of requests")
+
     set_app(app)
 
 
@@ -105,14 +117,20 @@ class ForemanliteGunicornApp(gunicorn.app.base.BaseApplication):
         Load configuration from given gunicorn config file.
 
         Current context will be made available under the 'ctx'
-        variable in globals.
+        variable in globals. Each config file is run as a module which
+        also sees the variables set by the config files before it.
+
+        `preload_app` defaults to True: the app and its routes are
+        already built by `setup` before gunicorn starts, so workers can
+        inherit them when forked instead of loading the app themselves.
+        Config files may still set it to False.
         """
 
-        namespace: t.Dict[str, t.Any] = {"ctx": self.ctx}
+        namespace: t.Dict[str, t.Any] = {"ctx": self.ctx, "preload_app": True}
         for config_file in self.config_files:
-            with config_file.open() as config_file_handler:
-                code = compile(config_file_handler.read(), config_file, "exec")
-                eval(code, namespace, namespace)
+            namespace.update(
+                runpy.run_path(str(config_file), init_globals=namespace)
+            )
         for key, value in namespace.items():
             if key in self.cfg.settings and value is not None:
                 self.cfg.set(key.lower(), value)
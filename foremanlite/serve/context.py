@@ -7,8 +7,6 @@ import typing as t
 from dataclasses import dataclass
 from pathlib import Path
 
-import redis
-
 from foremanlite.cli.config import Config
 from foremanlite.fsdata import FileSystemCache
 from foremanlite.logging import get as get_logger
@@ -16,11 +14,19 @@ from foremanlite.machine import MachineGroupSet
 from foremanlite.store import BaseMachineStore, RedisMachineStore
 from foremanlite.vars import DATA_DIR, EXEC_DIR, GROUPS_DIR
 
+if t.TYPE_CHECKING:
+    # importing redis is slow, so only do so once it is used, see
+    # ServeContext.get_store
+    import redis
+
 _dumb_logger = logging.getLogger("_dumb_logger")
 _dumb_logger.disabled = True
+_logger = get_logger("ServeContext")
+# redis connection pools by url, shared by every store get_store creates
+_REDIS_POOLS: t.Dict[str, "redis.ConnectionPool"] = {}
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ServeContext:
     """
     Set variables needed at runtime for running web-stuffs.
@@ -50,31 +56,49 @@ class ServeContext:
         exec_dir = config_dir / EXEC_DIR
         log_dir = Path(config.log_dir).absolute()
 
-        dirs = (
+        dirs = [
             ("config", config_dir),
             ("data", data_dir),
             ("groups", groups_dir),
             ("exec", exec_dir),
-            ("log", log_dir),
-        )
+        ]
+        # Exception lies in the log directory
+        # If no-persist was given, don't need to check
+        # for it
+        if config.persist_log:
+            dirs.append(("log", log_dir))
         for name, directory in dirs:
-            if not os.path.exists(directory):
-                # Exception lies in the log directory
-                # If no-persist was given, don't need to check
-                # for it
-                if not (name == "log" and not config.persist_log):
-                    raise ValueError(
-                        f"{name.upper()} directory does not exist, unable to "
-                        f"start: {directory}"
-                    )
-
-        logger.info(
-            f"Using the following directories: config: {str(config_dir)}, "
-            f"data: {str(data_dir.relative_to(config_dir))}, "
-            f"groups: {str(groups_dir.relative_to(config_dir))}, "
-            f"exec: {str(exec_dir.relative_to(config_dir))}, "
-            f"log: {str(log_dir)}"
-        )
+            # One stat per directory, which unlike os.path.exists tells
+            # a missing directory apart from one we can't access
+            try:
+                os.stat(directory)
+            except FileNotFoundError as err:
+                raise ValueError(
+                    f"{name.upper()} directory does not exist, unable to "
+                    f"start: {directory}"
+                ) from err
+            except PermissionError as err:
+                raise ValueError(
+                    f"{name.upper()} directory cannot be accessed, unable to "
+                    f"start: {directory}"
+                ) from err
+            except OSError as err:
+                # such as a file in the path, or a symlink loop
+                raise ValueError(
+                    f"{name.upper()} directory cannot be used, unable to "
+                    f"start: {directory}: {err.strerror}"
+                ) from err
+
+        # skip building the message when it won't be logged, such as
+        # with the disabled loggers the cli commands pass in
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                f"Using the following directories: config: {str(config_dir)}, "
+                f"data: {str(data_dir.relative_to(config_dir))}, "
+                f"groups: {str(groups_dir.relative_to(config_dir))}, "
+                f"exec: {str(exec_dir.relative_to(config_dir))}, "
+                f"log: {str(log_dir)}"
+            )
 
         return config_dir, data_dir, groups_dir, exec_dir, log_dir
 
@@ -86,8 +110,15 @@ class ServeContext:
 
         store = None
         if config.redis:
+            # importing redis is slow, so only do so when it is used
+            import redis  # pylint: disable=import-outside-toplevel
+
             logger.info("Using redis machine store")
-            store = RedisMachineStore(redis.from_url(config.redis_url))
+            pool = _REDIS_POOLS.get(config.redis_url)
+            if pool is None:
+                pool = redis.ConnectionPool.from_url(config.redis_url)
+                _REDIS_POOLS[config.redis_url] = pool
+            store = RedisMachineStore(redis.Redis(connection_pool=pool))
         else:
             logger.warning("No machine store was configured")
         return store
@@ -106,11 +137,19 @@ class ServeContext:
 
     @staticmethod
     def get_cache(
-        config: Config, logger: logging.Logger = _dumb_logger
+        config: Config,
+        logger: logging.Logger = _dumb_logger,
+        data_dir: t.Optional[Path] = None,
     ) -> FileSystemCache:
-        """Get FileSystemCache instance from the given config."""
+        """
+        Get FileSystemCache instance from the given config.
+
+        The data directory is found the same way as in `get_dirs`,
+        unless it's given already.
+        """
 
-        data_dir = os.path.abspath(os.path.join(config.config_dir, DATA_DIR))
+        if data_dir is None:
+            data_dir = Path(config.config_dir).absolute() / DATA_DIR
         try:
             cache = FileSystemCache(
                 data_dir,
@@ -130,13 +169,12 @@ class ServeContext:
     def from_config(cls, config: Config):
         """Create ServeContext using the given Config instance."""
 
-        logger = get_logger("ServeContext")
         config_dir, data_dir, groups_dir, exec_dir, log_dir = cls.get_dirs(
-            config, logger
+            config, _logger
         )
-        store = cls.get_store(config, logger)
-        cache = cls.get_cache(config, logger)
-        group_set = cls.get_group_set(groups_dir, cache=cache, logger=logger)
+        store = cls.get_store(config, _logger)
+        cache = cls.get_cache(config, _logger, data_dir=data_dir)
+        group_set = cls.get_group_set(groups_dir, cache=cache, logger=_logger)
         return cls(
             config=config,
             config_dir=config_dir,
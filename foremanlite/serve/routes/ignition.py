@@ -10,7 +10,7 @@ be treated as a jinja template. See
 `foremanlite.serve.util.render_machine_template` for
 information on how templates are handled.
 """
-from flask import render_template_string, request
+from flask import request
 from flask_restx import Namespace
 from flask_restx.resource import Resource
 
@@ -22,6 +22,7 @@ from foremanlite.serve.util import (
     construct_machine_vars,
     handle_template_request,
     machine_parser,
+    render_template_string,
 )
 from foremanlite.vars import BUTANE_DIR, BUTANE_EXEC, IGNITION_DIR_PATH
 
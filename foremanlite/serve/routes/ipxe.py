@@ -12,7 +12,6 @@ information on how templates are handled.
 import typing as t
 
 from flask import make_response, request
-from flask.templating import render_template_string
 from flask_restx import Namespace, Resource
 
 from foremanlite.fsdata import DataJinjaTemplate
@@ -22,6 +21,7 @@ from foremanlite.serve.util import (
     construct_machine_vars,
     handle_template_request,
     machine_parser,
+    render_template_string,
 )
 from foremanlite.vars import (
     IPXE_BOOT,
@@ -86,7 +86,7 @@ def _preflight_check_machine_exists(
 def _make_machine_response(machine: Machine):
     """Create a 200 response with json data describing the machine."""
 
-    resp = make_response(machine.json(), 200)
+    resp = make_response(machine.json_bytes(), 200)
     resp.headers["Content-Type"] = "application/json"
     return resp
 
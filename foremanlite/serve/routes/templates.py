@@ -11,11 +11,10 @@ Templates are served from `data/templates`.
 
 The function `foremanlite.serve.util.construct_machine_vars` will be
 used to construct the variables used to render templates.
-The method `flask.templating.render_template_string` will be used
-to actually render the template.
+The function `foremanlite.serve.util.render_template_string` will be
+used to actually render the template.
 """
 from flask import request
-from flask.templating import render_template_string
 from flask_restx import Namespace, Resource
 
 from foremanlite.fsdata import DataJinjaTemplate
@@ -25,6 +24,7 @@ from foremanlite.serve.util import (
     construct_machine_vars,
     handle_template_request,
     machine_parser,
+    render_template_string,
 )
 from foremanlite.vars import TEMPLATE_DIR
 
@@ -1,20 +1,32 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """General utilities for helping to serve foremanlite requests."""
+import functools
 import logging
+import os
+import time
 import typing as t
 from pathlib import Path
 
-from flask import make_response
+from flask import Flask, current_app, make_response
+from flask.signals import before_render_template, template_rendered
 from flask.wrappers import Request
 from flask_restx.inputs import boolean
 from flask_restx.reqparse import ParseResult, RequestParser
+from jinja2 import Environment, Template, TemplateError
 from werkzeug.exceptions import BadRequest
 
-from foremanlite.fsdata import DataJinjaTemplate
+from foremanlite.fsdata import DataFile, DataJinjaTemplate
 from foremanlite.machine import Arch, Mac, Machine, MachineGroup, get_uuid
 from foremanlite.serve.context import ServeContext
 from foremanlite.store import BaseMachineStore
+from foremanlite.vars import (
+    BUTANE_DIR,
+    GROUPS_UPDATE_INTERVAL,
+    IGNITION_DIR_PATH,
+    IPXE_DIR,
+    TEMPLATE_DIR,
+)
 
 machine_parser: RequestParser = RequestParser()
 machine_parser.add_argument("mac", type=Mac, required=True)
@@ -73,6 +85,76 @@ def repr_request(req: Request) -> str:
     return f"{req.method} {req.full_path} from {req.remote_addr}"
 
 
+@functools.lru_cache(maxsize=256)
+def _compile_template_string(env: Environment, source: str) -> Template:
+    """Compile the given template source in env, caching the result."""
+
+    return env.from_string(source)
+
+
+def render_template_string(source: str, **context: t.Any) -> str:
+    """
+    Render the given template source with the current app's environment.
+
+    Behaves the same as `flask.templating.render_template_string`,
+    except compiled templates are cached by their source, so a
+    template file which hasn't changed isn't parsed and compiled
+    again on every request. Works with `JinjaRenderFuncCallable`.
+    """
+
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+    template = _compile_template_string(app.jinja_env, source)
+    app.update_template_context(context)
+    before_render_template.send(app, template=template, context=context)
+    rendered = template.render(context)
+    template_rendered.send(app, template=template, context=context)
+    return rendered
+
+
+def warm_templates(
+    app: Flask, context: ServeContext, logger: logging.Logger
+) -> int:
+    """
+    Read and compile the files served as templates ahead of requests.
+
+    Files directly within the directories routes render templates out
+    of are read into the context's cache and compiled with the app's
+    jinja environment, so the first request for each doesn't have to.
+    Files which can't be read or compiled are skipped, requests for
+    them will report the error.
+
+    Returns
+    -------
+    int
+        Number of templates compiled.
+    """
+
+    num_warmed = 0
+    for dir_name in (IPXE_DIR, IGNITION_DIR_PATH, BUTANE_DIR, TEMPLATE_DIR):
+        try:
+            with os.scandir(context.data_dir / dir_name) as entries:
+                paths = [Path(e.path) for e in entries if e.is_file()]
+        except OSError as err:
+            logger.debug("Not warming templates in %s: %s", dir_name, err)
+            continue
+        for path in paths:
+            try:
+                source = DataFile(path, cache=context.cache).read()
+                _compile_template_string(app.jinja_env, source.decode())
+            except (OSError, ValueError, TemplateError) as err:
+                logger.debug("Not warming template %s: %s", path, err)
+            else:
+                num_warmed += 1
+
+    return num_warmed
+
+
+# Seconds a filename resolved by resolve_filename is reused for before
+# checking the filesystem again
+_RESOLVED_FILENAME_TTL = 1.0
+_RESOLVED_FILENAMES: t.Dict[t.Tuple[Path, str], t.Tuple[Path, float]] = {}
+
+
 def resolve_filename(
     requested: str,
     base_path: Path,
@@ -104,15 +186,32 @@ def resolve_filename(
     None
         The requested filename does not exist and a template for it does
         not exist either.
+
+    Found files are remembered for `_RESOLVED_FILENAME_TTL` seconds, so
+    repeated requests for the same file don't stat it every time.
     """
 
+    key = (base_path, requested)
+    now = time.monotonic()
+    cached = _RESOLVED_FILENAMES.get(key)
+    if cached is not None and now - cached[1] < _RESOLVED_FILENAME_TTL:
+        return cached[0]
+
+    resolved = None
     requested_path = base_path / requested
     potential_template = base_path / (requested + ".j2")
     if requested_path.exists():
-        return requested_path
-    if potential_template.exists():
-        return potential_template
-    return None
+        resolved = requested_path
+    elif potential_template.exists():
+        resolved = potential_template
+
+    # Only found files are remembered, so there's one entry per file
+    # at most, and files which are added show up right away
+    if resolved is not None:
+        _RESOLVED_FILENAMES[key] = (resolved, now)
+    else:
+        _RESOLVED_FILENAMES.pop(key, None)
+    return resolved
 
 
 class TemplateVarsRenderCallable(t.Protocol):
@@ -285,8 +384,9 @@ def handle_template_request(
       machines in the store
     * Find groups the machine belongs to
     * Construct variables for the template.
-    * Render and serve the template. If this cannot be done,
-      then raise `ValueError`.
+    * Render and serve the template. If the file was removed since it
+      was resolved, return 404. If it cannot be rendered, then raise
+      `ValueError`.
 
     Parameters
     ----------
@@ -337,11 +437,13 @@ def handle_template_request(
 
     logger.info(f"Got request from machine {machine}: {str(resolved_fn)}")
 
-    # Right now we'll update groups on every request to prioritizes
-    # accuracy. This can be rate-limited or done in parallel
-    # in the future if needed.
+    # Check group files for changes at most every GROUPS_UPDATE_INTERVAL
+    # seconds, rather than on every request. If another request is
+    # already updating them, there's no need to check the same files again.
     try:
-        num_changed = context.groups.update(logger=logger)
+        num_changed = context.groups.update(
+            logger=logger, wait=False, min_interval=GROUPS_UPDATE_INTERVAL
+        )
     except (OSError, ValueError) as err:
         logger.warning("Unable to update configured machine groups: %s", err)
     else:
@@ -372,7 +474,12 @@ def handle_template_request(
         )
         resp.headers["Content-Type"] = "text/plain"
         return resp
-    except ValueError as err:
+    except (OSError, ValueError) as err:
+        if not resolved_fn.exists():
+            # removed since it was resolved, don't keep resolving to it
+            _RESOLVED_FILENAMES.pop((base_dir, filename), None)
+            logger.warning(f"Requested file was removed: {str(resolved_fn)}")
+            return ("Requested file cannot be found", 404)
         logger.warning(
             f"Error occurred while rendering {str(resolved_fn)} "
             f"with vars {template_vars}: {err}"
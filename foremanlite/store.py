@@ -4,11 +4,15 @@ import typing as t
 from abc import ABC, abstractmethod
 
 import orjson
-import redis
 
 from foremanlite.logging import get as get_logger
 from foremanlite.machine import SHA256, Machine, get_uuid
 
+if t.TYPE_CHECKING:
+    # importing redis is slow, so only do so once it is used, see
+    # RedisMachineStore
+    import redis
+
 
 class BaseMachineStore(ABC):
     """ABC for a machine storage utility."""
@@ -57,16 +61,20 @@ class RedisMachineStore(BaseMachineStore):
 
     MACHINES_KEY = "machines"
 
-    def __init__(self, redis_conn: t.Optional[redis.Redis] = None, **kwargs):
+    def __init__(self, redis_conn: t.Optional["redis.Redis"] = None, **kwargs):
         if redis_conn is not None:
             self.redis = redis_conn
         else:
+            import redis  # pylint: disable=import-outside-toplevel
+
             self.redis = redis.Redis(**kwargs)
         self.logger = get_logger("RedisMachineStore")
 
     def ping(self) -> bool:
         """Try connecting to configured redis instance, logging results."""
 
+        import redis  # pylint: disable=import-outside-toplevel
+
         host = self.redis.connection_pool.connection_kwargs["host"]
         try:
             self.redis.ping()
@@ -83,7 +91,7 @@ class RedisMachineStore(BaseMachineStore):
         """Store the given machine."""
 
         uuid = get_uuid(machine=machine)
-        self.redis.set(uuid, machine.json())
+        self.redis.set(uuid, machine.json_bytes())
         machines = self.redis.get(self.MACHINES_KEY)
         if machines is None:
             self.redis.set(self.MACHINES_KEY, f'["{uuid}"]')
@@ -98,9 +106,8 @@ class RedisMachineStore(BaseMachineStore):
                 )
             else:
                 machine_list.append(uuid)
-            self.redis.set(
-                self.MACHINES_KEY, orjson.dumps(machine_list).decode("utf-8")
-            )
+            # redis takes bytes as-is, no need to decode
+            self.redis.set(self.MACHINES_KEY, orjson.dumps(machine_list))
         self.logger.info(f"Added machine with uuid {uuid}")
         self.logger.debug(f"Machine with {uuid}: {machine}")
 
@@ -109,7 +116,7 @@ class RedisMachineStore(BaseMachineStore):
 
         result: t.Optional[str] = self.redis.get(uuid)
         if result is not None:
-            return Machine.parse_raw(result)
+            return Machine.parse_obj(orjson.loads(result))
         return None
 
     def delete(self, uuid: SHA256) -> None:
@@ -157,7 +164,7 @@ class RedisMachineStore(BaseMachineStore):
             machine_json = self.redis.get(machine_uuid)
             if machine_json is None:
                 continue
-            result.add(Machine.parse_raw(machine_json))
+            result.add(Machine.parse_obj(orjson.loads(machine_json)))
         return result
 
     def find(self, **kwargs) -> t.Set[Machine]:
@@ -16,6 +16,11 @@ DATA_DIR = "data"  # directory containing files served to clients
 GROUPS_DIR = "groups"  # directory containing MachineGroup definitions
 EXEC_DIR = "exec"  # directory containing executables or their configs
 
+# --- Groups ---
+# Minimum number of seconds between checking group files for changes
+# while serving requests
+GROUPS_UPDATE_INTERVAL = 1.0
+
 # --- Static ---
 STATIC_DIR = "static"  # directory containing static files served to clients
 
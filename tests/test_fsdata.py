@@ -259,6 +259,19 @@ class TestDataJinjaTemplate:
             == result
         )
 
+    @staticmethod
+    def test_data_jinja_template_renders_changes_to_template(
+        contentdir_factory,
+    ):
+        """Test DataJinjaTemplate doesn't render a stale template."""
+
+        contentdir: Path = contentdir_factory()
+        path = contentdir / "template.j2"
+        path.write_text("{{ value }} one")
+        assert DataJinjaTemplate(path).render(value=1) == b"1 one"
+        path.write_text("{{ value }} two")
+        assert DataJinjaTemplate(path).render(value=2) == b"2 two"
+
     @staticmethod
     def test_data_jinja_template_can_use_custom_render_func(
         contentdir_factory,
@@ -6,20 +6,28 @@ Test components of foremanlite.machine
 The tests in here are pretty basic and non-exhaustive.
 Could use more work to get truly full coverage.
 """
+import os
+import pickle
 import re
 import typing as t
+from pathlib import Path
 
+import jinja2
 import pytest
 from hypothesis import given
 from hypothesis import strategies as st
 
+from foremanlite.fsdata import FileSystemCache
+from foremanlite.logging import DUMB_LOGGER
 from foremanlite.machine import (
     Arch,
+    FrozenMachine,
     Mac,
     Machine,
     MachineGroup,
     MachineGroupSet,
     MachineSelector,
+    MachineSelectorType,
     SelectorMatchStr,
     get_uuid,
 )
@@ -78,6 +86,58 @@ class TestMachine:
         assert hash(machine_one) != hash_one
         assert get_uuid(machine=machine_one) == uuid_one
 
+    @staticmethod
+    @given(machine_strategy())
+    def test_json_bytes_matches_json(machine: Machine):
+        """Test json_bytes gives the same document as json, as bytes."""
+
+        assert machine.json_bytes() == machine.json().encode("utf-8")
+        assert Machine.parse_raw(machine.json_bytes()) == machine
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_freeze_follows_changes_to_machine(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test freeze gives a snapshot of the machine's current attrs."""
+
+        machine_one, machine_two = machines
+        assert machine_one.freeze() == FrozenMachine(**machine_one.dict())
+        assert machine_one.freeze() != machine_two.freeze()
+        for key, value in machine_two.dict().items():
+            setattr(machine_one, key, value)
+        assert machine_one.freeze() == machine_two.freeze()
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_cached_uuid_follows_mac_and_arch(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test the uuid cached on a machine is reset when it changes."""
+
+        machine_one, machine_two = machines
+        assert machine_one.uuid == get_uuid(machine=machine_one)
+        machine_one.mac = machine_two.mac
+        machine_one.arch = machine_two.arch
+        assert machine_one.uuid == get_uuid(
+            mac=machine_two.mac, arch=machine_two.arch
+        )
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_copy_follows_updated_attrs(machines: t.Tuple[Machine, Machine]):
+        """Test a copy with new attrs doesn't keep the original's caches."""
+
+        machine_one, machine_two = machines
+        for cached in (hash, repr, Machine.freeze, lambda m: m.uuid):
+            cached(machine_one)
+        copied = machine_one.copy(update=machine_two.dict())
+        assert copied == machine_two
+        assert hash(copied) == hash(machine_two)
+        assert repr(copied) == repr(machine_two)
+        assert copied.freeze() == machine_two.freeze()
+        assert copied.uuid == machine_two.uuid
+
 
 class TestGetUUID:
     """Test functionality of foremanlite.machine.get_uuid"""
@@ -141,6 +201,43 @@ class TestMachineSelector:
             assert selector.matches(machine_one)
             assert not selector.matches(machine_two)
 
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_copy_matches_with_updated_attrs(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test a copy with new attrs doesn't keep the original's matcher."""
+
+        machine_one, machine_two = machines
+        selector = MachineSelector(
+            type="exact", attr="mac", val=machine_one.mac
+        )
+        assert selector.matches(machine_one)
+        copied = selector.copy(update={"val": machine_two.mac})
+        assert not copied.matches(machine_one)
+        assert copied.matches(machine_two)
+        assert selector.matches(machine_one)
+        copied = copied.copy(
+            update={"type": MachineSelectorType.regex, "val": "^$"}
+        )
+        assert not copied.matches(machine_two)
+        assert copied.copy(update={"val": ".*"}).matches(machine_two)
+
+    @staticmethod
+    def test_fields_cannot_be_set():
+        """Test selectors are immutable, as their matcher is cached."""
+
+        selector = MachineSelector(type="exact", attr="mac", val="mac")
+        with pytest.raises(TypeError):
+            selector.val = "changed"
+
+    @staticmethod
+    def test_regex_machine_selector_rejects_invalid_regex():
+        """Test regex MachineSelector raises ValueError on invalid regex."""
+
+        with pytest.raises(ValueError):
+            MachineSelector(type="regex", attr="mac", val="(unclosed")
+
 
 class TestSelectorMatchStr:
     """Test functionality of foremanlite.machine.SelectorMatchStr."""
@@ -179,6 +276,32 @@ class TestSelectorMatchStr:
             exp = bool_val_str.format(str(expected))
             assert SelectorMatchStr(exp=exp).test({}) == expected
 
+    @staticmethod
+    @given(
+        exp=st.sampled_from(
+            [
+                "{% if a and b %} True {% else %} False {% endif %}",
+                "{% if (a or b) and not c %}true{% else %}false{% endif %}",
+                "{% if a %}True{% elif not b %}False{% else %}True{% endif %}",
+                "{% if a or missing %} True {% else %} False {% endif %}",
+                "{% if a and range %} True {% else %} False {% endif %}",
+                "{% if not cycler or b %}True{% else %}False{% endif %}",
+                "{{ a and b }}",
+                "{% if a %}{{ b }}{% else %}False{% endif %}",
+            ]
+        ),
+        bool_vals=st.lists(st.booleans(), min_size=3, max_size=3),
+    )
+    def test_test_method_gives_same_result_as_rendering_template(
+        exp: str, bool_vals: t.List[bool]
+    ):
+        """Check compiled match strings agree with rendering the template."""
+
+        selector_values = dict(zip(["a", "b", "c"], bool_vals))
+        rendered = jinja2.Template(exp).render(**selector_values)
+        expected = rendered.strip().lower() == "true"
+        assert SelectorMatchStr(exp=exp).test(selector_values) == expected
+
     @staticmethod
     @given(
         bool_vals=st.lists(st.booleans(), min_size=4, max_size=4),
@@ -201,9 +324,11 @@ class TestSelectorMatchStr:
             zip(["name", "provision", "arch", "mac"], bool_vals)
         )
 
-        def mock_test(_, selector_values: t.Dict[str, bool]):
+        def mock_test(_, selector_values: t.Mapping[str, bool]):
             """Mock test method to check expected input"""
-            assert selector_values == selector_results
+            assert {
+                name: selector_values[name] for name in selector_results
+            } == selector_results
 
         monkeypatch.setattr(SelectorMatchStr, "test", mock_test)
 
@@ -222,6 +347,209 @@ class TestSelectorMatchStr:
 
         SelectorMatchStr(exp=exp).apply(machine_one, selectors)
 
+    @staticmethod
+    @given(machine=machine_strategy())
+    def test_apply_only_checks_selectors_it_needs(
+        machine: Machine, monkeypatch
+    ):
+        """Check apply short-circuits instead of checking every selector."""
+
+        checked: t.List[t.Optional[str]] = []
+        original_matches = MachineSelector.matches
+
+        def mock_matches(self, machine: Machine) -> bool:
+            """Mock matches method to record which selectors are checked"""
+            checked.append(self.name)
+            return original_matches(self, machine)
+
+        selectors = [
+            MachineSelector(
+                type="exact", name="a", attr="mac", val=machine.mac
+            ),
+            MachineSelector(type="exact", name="b", attr="arch", val="nope"),
+        ]
+        match_str = SelectorMatchStr(
+            exp="{% if a or b %} True {% else %} False {% endif %}"
+        )
+        with monkeypatch.context() as patch:
+            patch.setattr(MachineSelector, "matches", mock_matches)
+            assert match_str.apply(machine, selectors)
+        assert checked == ["a"]
+
+
+class TestMachineGroup:
+    """Test functionality of foremanlite.machine.MachineGroup"""
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_filter_returns_each_matching_machine_once(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test filter dedupes machines given more than once."""
+
+        machine_one, machine_two = machines
+        group = MachineGroup(
+            name="group",
+            selectors=[
+                MachineSelector(type="exact", attr="mac", val=machine_one.mac)
+            ],
+        )
+        assert group.filter(
+            [machine_one, machine_two, machine_one, machine_one]
+        ) == {machine_one}
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_matches_follows_changes_to_machine(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test cached match results are not reused for a changed machine."""
+
+        machine_one, machine_two = machines
+        group = MachineGroup(
+            name="group",
+            selectors=[
+                MachineSelector(type="exact", attr="mac", val=machine_one.mac)
+            ],
+        )
+        assert group.matches(machine_one)
+        assert not group.matches(machine_two)
+        machine_one.mac = machine_two.mac
+        assert not group.matches(machine_one)
+        machine_two.mac = group.selectors[0].val
+        assert group.matches(machine_two)
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_regex_selectors_on_one_attr_are_ored(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test combined regex selectors match like each one would alone."""
+
+        machine_one, machine_two = machines
+        for patterns in (
+            ["^$", f"^{re.escape(machine_one.mac)}$"],
+            ["^$", f"^{re.escape(machine_one.mac)}$", r"(.)\1\1\1\1\1"],
+            ["(?i)^$", f"^{re.escape(machine_one.mac)}$"],
+        ):
+            selectors = [
+                MachineSelector(type="regex", attr="mac", val=pattern)
+                for pattern in patterns
+            ]
+            group = MachineGroup(name="group", selectors=selectors)
+            for machine in machines:
+                assert group.matches(machine) == any(
+                    selector.matches(machine) for selector in selectors
+                )
+            assert group.matches(machine_one)
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_exact_selectors_on_one_attr_are_ored(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test exact selectors on the same attr match if any one does."""
+
+        machine_one, machine_two = machines
+        for key, value in machine_one.dict().items():
+            for other in ("also-not-a-value", ["unhashable"]):
+                group = MachineGroup(
+                    name="group",
+                    selectors=[
+                        MachineSelector(type="exact", attr=key, val=val)
+                        for val in ("not-a-value", value, other)
+                    ],
+                )
+                assert group.matches(machine_one)
+                assert group.matches(machine_two) == (
+                    getattr(machine_two, key) == value
+                )
+
+    @staticmethod
+    @given(machines=two_unique_machines_strategy())
+    def test_match_cache_is_bounded(
+        machines: t.Tuple[Machine, Machine], monkeypatch
+    ):
+        """Test match results are kept for a bounded number of machines."""
+
+        monkeypatch.setattr("foremanlite.machine._MATCH_CACHE_SIZE", 1)
+        machine_one, machine_two = machines
+        group = MachineGroup(
+            name="group",
+            selectors=[
+                MachineSelector(type="exact", attr="mac", val=machine_one.mac)
+            ],
+        )
+        assert group.matches(machine_one)
+        assert not group.matches(machine_two)
+        assert len(group._match_cache) == 1  # pylint: disable=protected-access
+        assert group.matches(machine_one)
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_copy_matches_with_updated_selectors(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test a copy with new selectors doesn't share the match cache."""
+
+        machine_one, machine_two = machines
+        group = MachineGroup(
+            name="group",
+            selectors=[
+                MachineSelector(type="exact", attr="mac", val=machine_one.mac)
+            ],
+        )
+        assert group.matches(machine_one)
+        copied = group.copy(
+            update={
+                "selectors": (
+                    MachineSelector(
+                        type="exact", attr="mac", val=machine_two.mac
+                    ),
+                )
+            }
+        )
+        assert copied != group
+        assert hash(copied) != hash(group)
+        assert not copied.matches(machine_one)
+        assert copied.matches(machine_two)
+        assert group.matches(machine_one)
+        assert MachineGroupSet(groups=[copied]).filter(machine_two) == [copied]
+
+    @staticmethod
+    def test_fields_cannot_be_set():
+        """Test groups are immutable, as their match results are cached."""
+
+        group = MachineGroup(name="group", selectors=[])
+        with pytest.raises(TypeError):
+            group.name = "changed"
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_unnamed_selectors_are_ored_onto_match_str(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test unnamed selectors are not passed to the match string."""
+
+        machine_one, machine_two = machines
+        group = MachineGroup(
+            name="group",
+            selectors=[
+                MachineSelector(type="regex", attr="mac", val="not-a-mac"),
+                MachineSelector(type="exact", attr="mac", val=machine_one.mac),
+                MachineSelector(
+                    name="two", type="exact", attr="mac", val=machine_two.mac
+                ),
+            ],
+            match_str=SelectorMatchStr(exp="{{ two }}"),
+        )
+        assert group.matches(machine_one)
+        assert group.matches(machine_two)
+        group = group.copy(
+            update={"match_str": SelectorMatchStr(exp="{{ not two }}")}
+        )
+        assert not group.matches(machine_two)
+
 
 class TestMachineGroupSet:
     """Test functionality of foremanlite.machine.MachineGroupSet"""
@@ -275,3 +603,343 @@ class TestMachineGroupSet:
         assert len(two_groups) == 1
         assert one_groups[0].name == "group_one"
         assert two_groups[0].name == "group_two"
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_filter_matches_checking_each_group(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test filter agrees with checking each group, in group order."""
+
+        machine_one, machine_two = machines
+        groups = [
+            MachineGroup(
+                name="exact",
+                selectors=[
+                    MachineSelector(type="exact", attr="mac", val=mac)
+                    for mac in (machine_one.mac, "not-a-mac")
+                ],
+            ),
+            MachineGroup(
+                name="regex",
+                selectors=[
+                    MachineSelector(type="regex", attr="arch", val=".*"),
+                ],
+            ),
+            MachineGroup(
+                name="regex_prefix",
+                selectors=[
+                    MachineSelector(
+                        type="regex",
+                        attr="mac",
+                        val=re.escape(machine_one.mac[:3]),
+                    ),
+                    MachineSelector(type="regex", attr="mac", val="not-a-mac"),
+                ],
+            ),
+            MachineGroup(
+                name="regex_backref",
+                selectors=[
+                    MachineSelector(
+                        type="regex", attr="mac", val=r"(?i)(.)\1|X"
+                    ),
+                ],
+            ),
+            MachineGroup(
+                name="match_str",
+                selectors=[
+                    MachineSelector(
+                        name="one", type="exact", attr="mac", val="not-a-mac"
+                    ),
+                ],
+                match_str=SelectorMatchStr(exp="{{ not one }}"),
+            ),
+            MachineGroup(
+                name="exact_again",
+                selectors=[
+                    MachineSelector(
+                        type="exact", attr="mac", val=machine_one.mac
+                    ),
+                ],
+            ),
+        ]
+        machine_group_set = MachineGroupSet(groups=groups)
+        for machine in machines:
+            assert machine_group_set.filter(machine) == [
+                group for group in groups if group.matches(machine)
+            ]
+
+        machine_group_set.groups = groups[:1]
+        assert machine_group_set.filter(machine_two) == []
+        assert machine_group_set.filter(machine_one) == groups[:1]
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_filter_follows_changes_to_groups(
+        machines: t.Tuple[Machine, Machine]
+    ):
+        """Test filter sees groups which were replaced."""
+
+        machine_one, machine_two = machines
+        selector = MachineSelector(
+            type="exact", attr="mac", val=machine_one.mac
+        )
+        group = MachineGroup(name="one", selectors=[selector])
+        machine_group_set = MachineGroupSet(groups=[group])
+        group = machine_group_set.groups[0]
+        assert machine_group_set.filter(machine_one) == [group]
+        assert group.matches(machine_one)
+
+        # groups may be replaced by changed copies
+        other_selector = selector.copy(update={"val": machine_two.mac})
+        group = group.copy(update={"selectors": (other_selector,)})
+        machine_group_set.groups[0] = group
+        assert machine_group_set.filter(machine_one) == []
+        assert machine_group_set.filter(machine_two) == [group]
+        group = group.copy(update={"selectors": (selector,)})
+        machine_group_set.groups[0] = group
+        assert machine_group_set.filter(machine_one) == [group]
+
+        # groups may be changed in place
+        other = MachineGroup(name="two", selectors=[selector])
+        machine_group_set.groups.append(other)
+        assert machine_group_set.filter(machine_one) == [group, other]
+        machine_group_set.groups[0] = other
+        assert machine_group_set.filter(machine_one) == [other, other]
+        del machine_group_set.groups[0]
+        assert machine_group_set.filter(machine_one) == [other]
+
+    @staticmethod
+    @given(two_unique_machines_strategy())
+    def test_filter_many_matches_filter(machines: t.Tuple[Machine, Machine]):
+        """Test filter_many gives the same result as filter per machine."""
+
+        groups = [
+            MachineGroup(
+                name=f"group_{i}",
+                selectors=[
+                    MachineSelector(type="exact", attr=attr, val=val)
+                    for attr, val in machine.dict().items()
+                ],
+            )
+            for i, machine in enumerate(machines)
+        ]
+        machine_group_set = MachineGroupSet(groups=groups)
+        assert machine_group_set.filter_many(machines) == [
+            machine_group_set.filter(machine) for machine in machines
+        ]
+
+    @staticmethod
+    @given(machine_strategy())
+    def test_can_be_pickled(machine: Machine):
+        """Test the set survives a pickle round-trip, lock and all."""
+
+        machine_group_set = MachineGroupSet(
+            groups=[
+                MachineGroup(
+                    name="group",
+                    selectors=[
+                        MachineSelector(
+                            type="exact", attr="mac", val=machine.mac
+                        )
+                    ],
+                ),
+                MachineGroup(
+                    name="match_str",
+                    selectors=[
+                        MachineSelector(
+                            type="exact", name="a", attr="mac", val=machine.mac
+                        )
+                    ],
+                    match_str=SelectorMatchStr(
+                        exp="{% if a %}True{% else %}False{% endif %}"
+                    ),
+                ),
+            ]
+        )
+        assert len(machine_group_set.filter(machine)) == 2
+        unpickled = pickle.loads(pickle.dumps(machine_group_set))
+        assert unpickled == machine_group_set
+        assert unpickled.filter(machine) == machine_group_set.filter(machine)
+
+    @staticmethod
+    def test_find_group_files_finds_nested_json_files_once(tmp_path: Path):
+        """Test group files in nested directories are each found once."""
+
+        nested = tmp_path / "one" / "two"
+        nested.mkdir(parents=True)
+        expected = {
+            tmp_path / "top.json",
+            tmp_path / "one" / "middle.json",
+            nested / "bottom.json",
+        }
+        for path in expected:
+            path.write_text("{}", "utf-8")
+        (nested / "ignored.txt").write_text("{}", "utf-8")
+        (tmp_path / "dir.json").mkdir()
+
+        found = MachineGroupSet.find_group_files(tmp_path, DUMB_LOGGER)
+        assert len(found) == len(expected)
+        assert set(found) == expected
+
+    @staticmethod
+    def test_update_skips_groups_with_unchanged_content(tmp_path: Path):
+        """Test update only re-parses groups whose content changed."""
+
+        group_file = tmp_path / "group.json"
+        group_file.write_text(
+            '{"name": "group", "selectors": '
+            '[{"type": "exact", "attr": "arch", "val": "x86_64"}]}',
+            "utf-8",
+        )
+        cache = FileSystemCache(tmp_path)
+        machine_group_set = MachineGroupSet.from_dir(
+            tmp_path, DUMB_LOGGER, cache=cache
+        )
+        group = machine_group_set.groups[0]
+
+        mtime_ns = group_file.stat().st_mtime_ns
+        os.utime(group_file, ns=(mtime_ns, mtime_ns + 1_000_000_000))
+        assert machine_group_set.update() == 0
+        assert machine_group_set.groups[0] is group
+
+        group_file.write_text(
+            '{"name": "group", "selectors": '
+            '[{"type": "exact", "attr": "arch", "val": "aarch64"}]}',
+            "utf-8",
+        )
+        os.utime(group_file, ns=(mtime_ns, mtime_ns + 2_000_000_000))
+        assert machine_group_set.update() == 1
+        assert machine_group_set.groups[0].selectors[0].val == "aarch64"
+
+    @staticmethod
+    def test_from_dir_loads_are_independent(tmp_path: Path):
+        """Test groups loaded by one from_dir aren't shared with another."""
+
+        (tmp_path / "group.json").write_text(
+            '{"name": "group", "selectors": []}', "utf-8"
+        )
+        group_set_one = MachineGroupSet.from_dir(tmp_path, DUMB_LOGGER)
+        group_set_two = MachineGroupSet.from_dir(tmp_path, DUMB_LOGGER)
+        assert group_set_one.groups[0] == group_set_two.groups[0]
+        assert group_set_one.groups[0] is not group_set_two.groups[0]
+
+    @staticmethod
+    def test_update_only_searches_for_groups_when_dirs_change(
+        tmp_path: Path, monkeypatch
+    ):
+        """Test update skips searching for new groups in unchanged dirs."""
+
+        group_json = (
+            '{"name": "%s", "selectors": '
+            '[{"type": "exact", "attr": "arch", "val": "x86_64"}]}'
+        )
+        nested_dir = tmp_path / "nested"
+        nested_dir.mkdir()
+        (nested_dir / "one.json").write_text(group_json % "one", "utf-8")
+        # make mtimes old enough to be trusted
+        for path in (nested_dir, tmp_path):
+            os.utime(path, ns=(0, 0))
+
+        machine_group_set = MachineGroupSet.from_dir(
+            tmp_path, DUMB_LOGGER, cache=FileSystemCache(tmp_path)
+        )
+        searches = []
+        search_group_files = MachineGroupSet._search_group_files
+
+        def mock_search_group_files(*args):
+            searches.append(args)
+            return search_group_files(*args)
+
+        monkeypatch.setattr(
+            MachineGroupSet,
+            "_search_group_files",
+            staticmethod(mock_search_group_files),
+        )
+        assert machine_group_set.update() == 0
+        assert not searches
+
+        (nested_dir / "two.json").write_text(group_json % "two", "utf-8")
+        assert machine_group_set.update() == 1
+        assert len(searches) == 1
+        assert {group.name for group in machine_group_set.groups} == {
+            "one",
+            "two",
+        }
+
+    @staticmethod
+    def test_update_loads_new_group_file_fixed_in_place(tmp_path: Path):
+        """Test a new group file which failed to parse is loaded once fixed."""
+
+        group_json = '{"name": "%s", "selectors": []}'
+        (tmp_path / "a.json").write_text(group_json % "a", "utf-8")
+        # make mtimes old enough to be trusted
+        os.utime(tmp_path, ns=(0, 0))
+        machine_group_set = MachineGroupSet.from_dir(
+            tmp_path, DUMB_LOGGER, cache=FileSystemCache(tmp_path)
+        )
+
+        group_file = tmp_path / "b.json"
+        group_file.write_text('{"name": "b", "selectors": [', "utf-8")
+        os.utime(tmp_path, ns=(1, 1))
+        with pytest.raises(ValueError):
+            machine_group_set.update()
+
+        # fixing the file in place leaves the directory's mtime as is
+        group_file.write_text(group_json % "b", "utf-8")
+        os.utime(tmp_path, ns=(1, 1))
+        assert machine_group_set.update() == 1
+        assert [group.name for group in machine_group_set.groups] == [
+            "a",
+            "b",
+        ]
+
+    @staticmethod
+    def test_update_without_wait_skips_when_already_updating(tmp_path: Path):
+        """Test update(wait=False) leaves updating to the current updater."""
+
+        cache = FileSystemCache(tmp_path)
+        machine_group_set = MachineGroupSet.from_dir(
+            tmp_path, DUMB_LOGGER, cache=cache
+        )
+        (tmp_path / "group.json").write_text(
+            '{"name": "group", "selectors": []}', "utf-8"
+        )
+        with machine_group_set._lock:  # pylint: disable=protected-access
+            assert machine_group_set.update(wait=False) == 0
+        assert machine_group_set.update(wait=False) == 1
+        assert [group.name for group in machine_group_set.groups] == ["group"]
+
+    @staticmethod
+    def test_update_skips_checking_within_min_interval(tmp_path: Path):
+        """Test update does not check again within min_interval."""
+
+        cache = FileSystemCache(tmp_path)
+        machine_group_set = MachineGroupSet.from_dir(
+            tmp_path, DUMB_LOGGER, cache=cache
+        )
+        assert machine_group_set.update(min_interval=3600) == 0
+        (tmp_path / "group.json").write_text(
+            '{"name": "group", "selectors": []}', "utf-8"
+        )
+        assert machine_group_set.update(min_interval=3600) == 0
+        assert machine_group_set.update() == 1
+
+    @staticmethod
+    def test_update_retries_after_failing_within_min_interval(tmp_path: Path):
+        """Test a failed update is retried on the next call to update."""
+
+        cache = FileSystemCache(tmp_path)
+        machine_group_set = MachineGroupSet.from_dir(
+            tmp_path, DUMB_LOGGER, cache=cache
+        )
+        group_file = tmp_path / "group.json"
+        group_file.write_text('{"name": "group", "selectors": [', "utf-8")
+        with pytest.raises(ValueError):
+            machine_group_set.update(min_interval=3600)
+        with pytest.raises(ValueError):
+            machine_group_set.update(min_interval=3600)
+
+        group_file.write_text('{"name": "group", "selectors": []}', "utf-8")
+        assert machine_group_set.update(min_interval=3600) == 1
+        assert [group.name for group in machine_group_set.groups] == ["group"]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# pylint: disable=redefined-outer-name
+"""Test functionality of the foremanlite flask app."""
+import shutil
+from pathlib import Path
+
+import pytest
+
+from foremanlite.cli.config import Config
+from foremanlite.serve import app
+from foremanlite.serve.context import get_context
+from foremanlite.vars import (
+    DATA_DIR,
+    EXEC_DIR,
+    GROUPS_DIR,
+    IPXE_BOOT,
+    IPXE_DIR,
+)
+
+pytestmark = pytest.mark.usefixtures("do_log_teardown")
+
+ETC_DATA_DIR = Path(__file__).parent.parent / "etc" / "foremanlite" / DATA_DIR
+
+
+@pytest.fixture()
+def client(contentdir_factory):
+    """Setup the app with the example boot file, returning a test client."""
+
+    config_dir: Path = contentdir_factory()
+    for directory in (DATA_DIR, EXEC_DIR, GROUPS_DIR):
+        (config_dir / directory).mkdir()
+    (config_dir / DATA_DIR / IPXE_DIR).mkdir()
+    shutil.copy(
+        ETC_DATA_DIR / IPXE_DIR / IPXE_BOOT,
+        config_dir / DATA_DIR / IPXE_DIR / IPXE_BOOT,
+    )
+    app.setup(config=Config(redis=False, config_dir=str(config_dir)))
+    return app.get_app().test_client()
+
+
+class TestIPXEBoot:
+    """Test the iPXE boot file endpoint."""
+
+    @staticmethod
+    def test_boot_file_chains_to_the_requested_host(client):
+        """Test the boot file is rendered for the host it was asked from."""
+
+        boot_url = f"/ipxe/{IPXE_BOOT.removesuffix('.j2')}"
+        for host in ("http://localhost", "http://foremanlite.example:8080"):
+            resp = client.get(boot_url, base_url=host)
+            assert resp.status_code == 200
+            assert f"{host}/ipxe/start.ipxe" in resp.get_data(as_text=True)
+
+
+class TestIPXEFiles:
+    """Test the endpoint serving other iPXE files."""
+
+    @staticmethod
+    def test_removed_file_is_not_found(client):
+        """Test a file removed after being served gives a 404."""
+
+        ipxe_file = get_context().data_dir / IPXE_DIR / "hello.ipxe.j2"
+        ipxe_file.write_text("#!ipxe\n", "utf-8")
+        url = "/ipxe/hello.ipxe?mac=00:00:00:00:00:00&arch=x86_64"
+        assert client.get(url).status_code == 200
+        ipxe_file.unlink()
+        assert client.get(url).status_code == 404